@@ -24,7 +24,7 @@ from ..build import Executable, Jar, SharedLibrary, SharedModule, StaticLibrary
 from ..mparser import BaseNode, ArithmeticNode, ArrayNode, ElementaryNode, IdNode, FunctionNode, StringNode
 import os
 
-build_target_functions = ['executable', 'jar', 'library', 'shared_library', 'shared_module', 'static_library', 'both_libraries']
+build_target_functions = frozenset(['executable', 'jar', 'library', 'shared_library', 'shared_module', 'static_library', 'both_libraries'])
 
 class IntrospectionHelper:
     # mimic an argparse namespace
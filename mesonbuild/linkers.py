@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import abc
+import collections
+import functools
 import os
 import typing
 
@@ -22,6 +24,11 @@ if typing.TYPE_CHECKING:
     from .coredata import OptionDictType
     from .environment import Environment
 
+# These describe the machine meson is running on, which cannot change
+# while it runs, so only check them once.
+_is_dragonfly_or_openbsd = mesonlib.is_dragonflybsd() or mesonlib.is_openbsd()
+_is_sunos = mesonlib.is_sunos()
+
 
 class StaticLinker:
 
@@ -91,6 +98,7 @@ class VisualStudioLikeLinker:
 
     def __init__(self, machine: str):
         self.machine = machine
+        self.machine_args = ['/MACHINE:' + machine] if machine else []  # type: typing.List[str]
 
     def get_always_args(self) -> typing.List[str]:
         return self.always_args.copy()
@@ -99,11 +107,7 @@ class VisualStudioLikeLinker:
         return self.always_args.copy()
 
     def get_output_args(self, target: str) -> typing.List[str]:
-        args = []  # type: typing.List[str]
-        if self.machine:
-            args += ['/MACHINE:' + self.machine]
-        args += ['/OUT:' + target]
-        return args
+        return self.machine_args + ['/OUT:' + target]
 
     @classmethod
     def unix_args_to_native(cls, args: typing.List[str]) -> typing.List[str]:
@@ -134,17 +138,22 @@ class IntelVisualStudioLinker(VisualStudioLikeLinker, StaticLinker):
         VisualStudioLikeLinker.__init__(self, machine)
 
 
+@functools.lru_cache(maxsize=None)
+def _ar_std_arg(exelist: typing.Tuple[str, ...]) -> str:
+    # The answer only depends on the ar binary, so only ask it once.
+    stdo = mesonlib.Popen_safe(list(exelist) + ['-h'])[1]
+    # Enable deterministic builds if they are available.
+    if '[D]' in stdo:
+        return 'csrD'
+    return 'csr'
+
+
 class ArLinker(StaticLinker):
 
     def __init__(self, exelist: typing.List[str]):
         super().__init__(exelist)
         self.id = 'ar'
-        pc, stdo = mesonlib.Popen_safe(self.exelist + ['-h'])[0:2]
-        # Enable deterministic builds if they are available.
-        if '[D]' in stdo:
-            self.std_args = ['csrD']
-        else:
-            self.std_args = ['csr']
+        self.std_args = [_ar_std_arg(tuple(self.exelist))]
 
     def get_std_link_args(self) -> typing.List[str]:
         return self.std_args
@@ -170,6 +179,14 @@ class DLinker(StaticLinker):
         super().__init__(exelist)
         self.id = exelist[0]
         self.arch = arch
+        self.always_args = []  # type: typing.List[str]
+        if mesonlib.is_windows():
+            if self.arch == 'x86_64':
+                self.always_args = ['-m64']
+            elif self.arch == 'x86_mscoff' and self.id == 'dmd':
+                self.always_args = ['-m32mscoff']
+            else:
+                self.always_args = ['-m32']
 
     def get_std_link_args(self) -> typing.List[str]:
         return ['-lib']
@@ -178,13 +195,7 @@ class DLinker(StaticLinker):
         return ['-of=' + target]
 
     def get_linker_always_args(self) -> typing.List[str]:
-        if mesonlib.is_windows():
-            if self.arch == 'x86_64':
-                return ['-m64']
-            elif self.arch == 'x86_mscoff' and self.id == 'dmd':
-                return ['-m32mscoff']
-            return ['-m32']
-        return []
+        return self.always_args.copy()
 
 
 class CcrxLinker(StaticLinker):
@@ -207,6 +218,8 @@ def prepare_rpaths(raw_rpaths: str, build_dir: str, from_dir: str) -> typing.Lis
     # The rpaths we write must be relative if they point to the build dir,
     # because otherwise they have different length depending on the build
     # directory. This breaks reproducible builds.
+    if not raw_rpaths:
+        return []
     internal_format_rpaths = [evaluate_rpath(p, build_dir, from_dir) for p in raw_rpaths]
     ordered_rpaths = order_rpaths(internal_format_rpaths)
     return ordered_rpaths
@@ -219,12 +232,23 @@ def order_rpaths(rpath_list: typing.List[str]) -> typing.List[str]:
     # in the file system, such as /lib/x86_64-linux-gnu.
     #
     # The correct thing to do here would be C++'s std::stable_partition.
-    # Python standard library does not have it, so replicate it with
-    # sort, which is guaranteed to be stable.
-    return sorted(rpath_list, key=os.path.isabs)
+    # Python standard library does not have it, so do the partition by
+    # hand in a single pass, which keeps the original relative order.
+    relative = []  # type: typing.List[str]
+    absolute = []  # type: typing.List[str]
+    isabs = os.path.isabs
+    for p in rpath_list:
+        if isabs(p):
+            absolute.append(p)
+        else:
+            relative.append(p)
+    return relative + absolute
 
 
+@functools.lru_cache(maxsize=4096)
 def evaluate_rpath(p: str, build_dir: str, from_dir: str) -> str:
+    # The same rpaths get evaluated for every target in a directory, and
+    # relpath is not cheap, so cache the results.
     if p == from_dir:
         return '' # relpath errors out in this case
     elif os.path.isabs(p):
@@ -246,9 +270,10 @@ class DynamicLinker(metaclass=abc.ABCMeta):
         'custom': [],
     }  # type: typing.Dict[str, typing.List[str]]
 
-    def _apply_prefix(self, arg: str) -> typing.List[str]:
-        if isinstance(self.prefix_arg, str):
-            return [self.prefix_arg + arg]
+    def _apply_str_prefix(self, arg: str) -> typing.List[str]:
+        return [self.prefix_arg + arg]
+
+    def _apply_list_prefix(self, arg: str) -> typing.List[str]:
         return self.prefix_arg + [arg]
 
     def __init__(self, exelist: typing.List[str], for_machine: mesonlib.MachineChoice,
@@ -258,6 +283,13 @@ class DynamicLinker(metaclass=abc.ABCMeta):
         self.version = version
         self.id = id_
         self.prefix_arg = prefix_arg
+        # _apply_prefix is called for nearly every linker argument, so pick
+        # the right implementation once instead of checking the type of
+        # prefix_arg on each call.
+        if isinstance(prefix_arg, str):
+            self._apply_prefix = self._apply_str_prefix  # type: typing.Callable[[str], typing.List[str]]
+        else:
+            self._apply_prefix = self._apply_list_prefix
 
     def __repr__(self) -> str:
         return '<{}: v{} `{}`>'.format(type(self).__name__, self.version, ' '.join(self.exelist))
@@ -432,10 +464,25 @@ class GnuLikeDynamicLinkerMixin:
         'custom': [],
     }  # type: typing.Dict[str, typing.List[str]]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The prefix can't change after construction, so apply it to the
+        # buildtype arguments once rather than on every link.
+        self._prefixed_buildtype_args = {}  # type: typing.Dict[str, typing.List[str]]
+        for buildtype, bt_args in self._BUILDTYPE_ARGS.items():
+            prefixed = []  # type: typing.List[str]
+            for a in bt_args:
+                prefixed.extend(self._apply_prefix(a))
+            self._prefixed_buildtype_args[buildtype] = prefixed
+        # -rpath-link is passed once per rpath, so split the prefixed flag
+        # into the arguments that go before each path and the string that
+        # the path is appended to.
+        *self._rpath_link_args, self._rpath_link_flag = self._apply_prefix('-rpath-link,')
+
     def get_buildtype_args(self, buildtype: str) -> typing.List[str]:
         # We can override these in children by just overriding the
         # _BUILDTYPE_ARGS value.
-        return mesonlib.listify([self._apply_prefix(a) for a in self._BUILDTYPE_ARGS[buildtype]])
+        return self._prefixed_buildtype_args[buildtype]
 
     def get_pie_args(self) -> typing.List[str]:
         return ['-pie']
@@ -494,7 +541,7 @@ class GnuLikeDynamicLinkerMixin:
             # For PE/COFF the soname argument has no effect
             return []
         sostr = '' if soversion is None else '.' + soversion
-        return self._apply_prefix('-soname,{}{}.{}{}'.format(prefix, shlib_name, suffix, sostr))
+        return self._apply_prefix('-soname,' + prefix + shlib_name + '.' + suffix + sostr)
 
     def build_rpath_args(self, env: 'Environment', build_dir: str, from_dir: str,
                          rpath_paths: str, build_rpath: str,
@@ -506,17 +553,22 @@ class GnuLikeDynamicLinkerMixin:
             return []
         args = []
         origin_placeholder = '$ORIGIN'
-        processed_rpaths = prepare_rpaths(rpath_paths, build_dir, from_dir)
         # Need to deduplicate rpaths, as macOS's install_name_tool
         # is *very* allergic to duplicate -delete_rpath arguments
         # when calling depfixer on installation.
-        all_paths = mesonlib.OrderedSet([os.path.join(origin_placeholder, p) for p in processed_rpaths])
+        # OrderedDict rather than a plain dict as the latter is only
+        # ordered from Python 3.7.
+        all_paths = collections.OrderedDict()  # type: typing.Dict[str, None]
+        if rpath_paths:
+            join = os.path.join
+            all_paths.update((join(origin_placeholder, p), None)
+                             for p in prepare_rpaths(rpath_paths, build_dir, from_dir))
         # Build_rpath is used as-is (it is usually absolute).
         if build_rpath != '':
-            all_paths.add(build_rpath)
+            all_paths[build_rpath] = None
 
         # TODO: should this actually be "for (dragonfly|open)bsd"?
-        if mesonlib.is_dragonflybsd() or mesonlib.is_openbsd():
+        if _is_dragonfly_or_openbsd:
             # This argument instructs the compiler to record the value of
             # ORIGIN in the .dynamic section of the elf. On Linux this is done
             # by default, but is not on dragonfly/openbsd for some reason. Without this
@@ -528,15 +580,15 @@ class GnuLikeDynamicLinkerMixin:
         # enough space in the ELF header to hold the final installation RPATH.
         paths = ':'.join(all_paths)
         if len(paths) < len(install_rpath):
-            padding = 'X' * (len(install_rpath) - len(paths))
             if not paths:
-                paths = padding
+                paths = 'X' * len(install_rpath)
             else:
-                paths = paths + ':' + padding
+                # A separator, then one X for each missing character.
+                paths = (paths + ':').ljust(len(install_rpath) + 1, 'X')
         args.extend(self._apply_prefix('-rpath,' + paths))
 
         # TODO: should this actually be "for solaris/sunos"?
-        if mesonlib.is_sunos():
+        if _is_sunos:
             return args
 
         # Rpaths to use while linking must be absolute. These are not
@@ -554,8 +606,10 @@ class GnuLikeDynamicLinkerMixin:
         # ...instead of just one single looooong option, like this:
         #
         #   -Wl,-rpath-link,/path/to/folder1:/path/to/folder2:...
+        join = os.path.join
         for p in rpath_paths:
-            args.extend(self._apply_prefix('-rpath-link,' + os.path.join(build_dir, p)))
+            args.extend(self._rpath_link_args)
+            args.append(self._rpath_link_flag + join(build_dir, p))
 
         return args
 
@@ -608,11 +662,8 @@ class AppleDynamicLinker(PosixDynamicLinkerMixin, DynamicLinker):
                         is_shared_module: bool) -> typing.List[str]:
         if is_shared_module:
             return []
-        install_name = ['@rpath/', prefix, shlib_name]
-        if soversion is not None:
-            install_name.append('.' + soversion)
-        install_name.append('.dylib')
-        args = ['-install_name', ''.join(install_name)]
+        sostr = '' if soversion is None else '.' + soversion
+        args = ['-install_name', '@rpath/' + prefix + shlib_name + sostr + '.dylib']
         if darwin_versions:
             args.extend(['-compatibility_version', darwin_versions[0],
                          '-current_version', darwin_versions[1]])
@@ -629,10 +680,13 @@ class AppleDynamicLinker(PosixDynamicLinkerMixin, DynamicLinker):
         # @loader_path is the equivalent of $ORIGIN on macOS
         # https://stackoverflow.com/q/26280738
         origin_placeholder = '@loader_path'
-        processed_rpaths = prepare_rpaths(rpath_paths, build_dir, from_dir)
-        all_paths = mesonlib.OrderedSet([os.path.join(origin_placeholder, p) for p in processed_rpaths])
+        all_paths = collections.OrderedDict()  # type: typing.Dict[str, None]
+        if rpath_paths:
+            join = os.path.join
+            all_paths.update((join(origin_placeholder, p), None)
+                             for p in prepare_rpaths(rpath_paths, build_dir, from_dir))
         if build_rpath != '':
-            all_paths.add(build_rpath)
+            all_paths[build_rpath] = None
         for rp in all_paths:
             args.extend(self._apply_prefix('-rpath,' + rp))
 
@@ -905,27 +959,30 @@ class SolarisDynamicLinker(PosixDynamicLinkerMixin, DynamicLinker):
                          install_rpath: str) -> typing.List[str]:
         if not rpath_paths and not install_rpath and not build_rpath:
             return []
-        processed_rpaths = prepare_rpaths(rpath_paths, build_dir, from_dir)
-        all_paths = mesonlib.OrderedSet([os.path.join('$ORIGIN', p) for p in processed_rpaths])
+        all_paths = collections.OrderedDict()  # type: typing.Dict[str, None]
+        if rpath_paths:
+            join = os.path.join
+            all_paths.update((join('$ORIGIN', p), None)
+                             for p in prepare_rpaths(rpath_paths, build_dir, from_dir))
         if build_rpath != '':
-            all_paths.add(build_rpath)
+            all_paths[build_rpath] = None
 
         # In order to avoid relinking for RPATH removal, the binary needs to contain just
         # enough space in the ELF header to hold the final installation RPATH.
         paths = ':'.join(all_paths)
         if len(paths) < len(install_rpath):
-            padding = 'X' * (len(install_rpath) - len(paths))
             if not paths:
-                paths = padding
+                paths = 'X' * len(install_rpath)
             else:
-                paths = paths + ':' + padding
+                # A separator, then one X for each missing character.
+                paths = (paths + ':').ljust(len(install_rpath) + 1, 'X')
         return self._apply_prefix('-rpath,{}'.format(paths))
 
     def get_soname_args(self, env: 'Environment', prefix: str, shlib_name: str,
                         suffix: str, soversion: str, darwin_versions: typing.Tuple[str, str],
                         is_shared_module: bool) -> typing.List[str]:
         sostr = '' if soversion is None else '.' + soversion
-        return self._apply_prefix('-soname,{}{}.{}{}'.format(prefix, shlib_name, suffix, sostr))
+        return self._apply_prefix('-soname,' + prefix + shlib_name + '.' + suffix + sostr)
 
 
 class OptlinkDynamicLinker(VisualStudioLikeLinkerMixin, DynamicLinker):
@@ -944,6 +1001,7 @@ class OptlinkDynamicLinker(VisualStudioLikeLinkerMixin, DynamicLinker):
 class CudaLinker(PosixDynamicLinkerMixin, DynamicLinker):
     """Cuda linker (nvlink)"""
     @staticmethod
+    @functools.lru_cache(maxsize=None)
     def parse_version():
         version_cmd = ['nvlink', '--version']
         try:
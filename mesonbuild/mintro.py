@@ -19,6 +19,7 @@ tests and so on. All output is in JSON for simple parsing.
 Currently only works for the Ninja backend. Others use generated
 project files and don't need this info."""
 
+import functools
 import json
 from . import build, coredata as cdata
 from . import mesonlib
@@ -71,11 +72,26 @@ def get_meson_introspection_types(coredata: Optional[cdata.CoreData] = None,
         'tests': IntroCommand('List all unit tests', func=lambda: list_tests(testdata)),
     }
 
+@functools.lru_cache(maxsize=None)
+def get_meson_introspection_descriptions() -> Tuple[Tuple[str, str], ...]:
+    '''The name and description of every introspection type.'''
+    return tuple((k, v.desc) for k, v in _get_unbound_introspection_types().items())
+
+@functools.lru_cache(maxsize=None)
+def get_meson_introspection_files() -> Tuple[str, ...]:
+    '''The introspection types that are dumped to intro-*.json files.'''
+    return tuple(k for k, v in _get_unbound_introspection_types().items() if v.func)
+
+@functools.lru_cache(maxsize=None)
+def _get_unbound_introspection_types() -> Dict[str, IntroCommand]:
+    # Without any build data the commands can only be used to describe
+    # the introspection types, and they are always the same.
+    return get_meson_introspection_types()
+
 def add_arguments(parser):
-    intro_types = get_meson_introspection_types()
-    for key, val in intro_types.items():
+    for key, desc in get_meson_introspection_descriptions():
         flag = '--' + key.replace('_', '-')
-        parser.add_argument(flag, action='store_true', dest=key, default=False, help=val.desc)
+        parser.add_argument(flag, action='store_true', dest=key, default=False, help=desc)
 
     parser.add_argument('--backend', choices=cdata.backendlist, dest='backend', default='ninja',
                         help='The backend to use for the --buildoptions introspection.')
@@ -90,39 +106,44 @@ def add_arguments(parser):
 def list_installed(installdata):
     res = {}
     if installdata is not None:
+        join = os.path.join
+        basename = os.path.basename
+        prefix = installdata.prefix
+        build_dir = installdata.build_dir
         for t in installdata.targets:
-            res[os.path.join(installdata.build_dir, t.fname)] = \
-                os.path.join(installdata.prefix, t.outdir, os.path.basename(t.fname))
+            res[join(build_dir, t.fname)] = join(prefix, t.outdir, basename(t.fname))
         for path, installpath, _ in installdata.data:
-            res[path] = os.path.join(installdata.prefix, installpath)
+            res[path] = join(prefix, installpath)
         for path, installdir, _ in installdata.headers:
-            res[path] = os.path.join(installdata.prefix, installdir, os.path.basename(path))
+            res[path] = join(prefix, installdir, basename(path))
         for path, installpath, _ in installdata.man:
-            res[path] = os.path.join(installdata.prefix, installpath)
+            res[path] = join(prefix, installpath)
         for path, installpath, _, _ in installdata.install_subdirs:
-            res[path] = os.path.join(installdata.prefix, installpath)
+            res[path] = join(prefix, installpath)
     return res
 
 def list_targets_from_source(intr: IntrospectionInterpreter) -> List[Dict[str, Union[bool, str, List[Union[str, Dict[str, Union[str, List[str], bool]]]]]]]:
     tlist = []  # type: List[Dict[str, Union[bool, str, List[Union[str, Dict[str, Union[str, List[str], bool]]]]]]]
+    root_dir = os.path.abspath(intr.source_root)
     for i in intr.targets:
         sources = []  # type: List[str]
         for n in i['sources']:
             args = []  # type: List[Union[str, StringNode]]
             if isinstance(n, FunctionNode):
-                args = list(n.args.arguments)
+                args = n.args.arguments
                 if n.func_name in build_target_functions:
-                    args.pop(0)
+                    args = args[1:]
             elif isinstance(n, ArrayNode):
                 args = n.args.arguments
             elif isinstance(n, ArgumentNode):
                 args = n.arguments
             for j in args:
                 if isinstance(j, StringNode):
-                    sources += [j.value]
+                    sources.append(j.value)
                 elif isinstance(j, str):
-                    sources += [j]
+                    sources.append(j)
 
+        subdir_abs = os.path.join(root_dir, i['subdir'])
         tlist += [{
             'name': i['name'],
             'id': i['id'],
@@ -134,7 +155,7 @@ def list_targets_from_source(intr: IntrospectionInterpreter) -> List[Dict[str, U
                 'language': 'unknown',
                 'compiler': [],
                 'parameters': [],
-                'sources': [os.path.normpath(os.path.join(os.path.abspath(intr.source_root), i['subdir'], x)) for x in sources],
+                'sources': [os.path.normpath(os.path.join(subdir_abs, x)) for x in sources],
                 'generated_sources': []
             }],
             'subproject': None, # Subprojects are not supported
@@ -151,19 +172,31 @@ def list_targets(builddata: build.Build, installdata, backend: backends.Backend)
     # Fast lookup table for installation files
     install_lookuptable = {}
     for i in installdata.targets:
-        outname = os.path.join(installdata.prefix, i.outdir, os.path.basename(i.fname))
-        install_lookuptable[os.path.basename(i.fname)] = str(pathlib.PurePath(outname))
+        basename = os.path.basename(i.fname)
+        outname = os.path.join(installdata.prefix, i.outdir, basename)
+        install_lookuptable[basename] = str(pathlib.PurePath(outname))
+
+    # Many targets share a subdir, so only build the per-subdir paths once
+    subdir_paths = {}  # type: Dict[str, Tuple[str, str]]
 
     for (idname, target) in builddata.get_targets().items():
         if not isinstance(target, build.Target):
             raise RuntimeError('The target object in `builddata.get_targets()` is not of type `build.Target`. Please file a bug with this error message.')
 
+        paths = subdir_paths.get(target.subdir)
+        if paths is None:
+            paths = (os.path.normpath(os.path.join(src_dir, target.subdir, 'meson.build')),
+                     os.path.join(build_dir, target.subdir, ''))
+            subdir_paths[target.subdir] = paths
+        defined_in, out_prefix = paths
+        outputs = target.get_outputs()
+
         t = {
             'name': target.get_basename(),
             'id': idname,
             'type': target.get_typename(),
-            'defined_in': os.path.normpath(os.path.join(src_dir, target.subdir, 'meson.build')),
-            'filename': [os.path.join(build_dir, target.subdir, x) for x in target.get_outputs()],
+            'defined_in': defined_in,
+            'filename': [out_prefix + x for x in outputs],
             'build_by_default': target.build_by_default,
             'target_sources': backend.get_introspection_data(idname, target),
             'subproject': target.subproject or None
@@ -171,7 +204,7 @@ def list_targets(builddata: build.Build, installdata, backend: backends.Backend)
 
         if installdata and target.should_install():
             t['installed'] = True
-            t['install_filename'] = [install_lookuptable.get(x, None) for x in target.get_outputs()]
+            t['install_filename'] = [install_lookuptable.get(x) for x in outputs]
         else:
             t['installed'] = False
         tlist.append(t)
@@ -205,8 +238,7 @@ def list_buildoptions(coredata: cdata.CoreData) -> List[Dict[str, Union[str, boo
     core_options = {k: o for k, o in coredata.builtins.items() if k in core_option_names}
 
     def add_keys(options: Dict[str, cdata.UserOption], section: str, machine: str = 'any') -> None:
-        for key in sorted(options.keys()):
-            opt = options[key]
+        for key, opt in sorted(options.items()):
             optdict = {'name': key, 'value': opt.value, 'section': section, 'machine': machine}
             if isinstance(opt, cdata.UserStringOption):
                 typestr = 'string'
@@ -248,10 +280,26 @@ def list_buildoptions(coredata: cdata.CoreData) -> List[Dict[str, Union[str, boo
 def find_buildsystem_files_list(src_dir) -> List[str]:
     # I feel dirty about this. But only slightly.
     filelist = []  # type: List[str]
-    for root, _, files in os.walk(src_dir):
-        for f in files:
-            if f == 'meson.build' or f == 'meson_options.txt':
-                filelist.append(os.path.relpath(os.path.join(root, f), src_dir))
+    # Walk the tree by hand with scandir rather than os.walk, so that the
+    # file type comes from the directory entry and no extra stat calls
+    # are needed. Like os.walk, symlinks to directories are not followed,
+    # unreadable directories are skipped and the files are returned in
+    # top-down order.
+    prefix_len = len(os.path.join(src_dir, ''))
+    dirs = [src_dir]
+    while dirs:
+        try:
+            entries = list(os.scandir(dirs.pop()))
+        except OSError:
+            continue
+        subdirs = []  # type: List[str]
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.name == 'meson.build' or entry.name == 'meson_options.txt':
+                filelist.append(entry.path[prefix_len:])
+        # Pushed in reverse so that they are popped in listing order
+        dirs.extend(reversed(subdirs))
     return filelist
 
 def list_buildsystem_files(builddata: build.Build) -> List[str]:
@@ -286,23 +334,24 @@ def list_deps(coredata: cdata.CoreData) -> List[Dict[str, Union[str, List[str]]]
 def get_test_list(testdata) -> List[Dict[str, Union[str, int, List[str], Dict[str, str]]]]:
     result = []  # type: List[Dict[str, Union[str, int, List[str], Dict[str, str]]]]
     for t in testdata:
-        to = {}
         if isinstance(t.fname, str):
             fname = [t.fname]
         else:
             fname = t.fname
-        to['cmd'] = fname + t.cmd_args
         if isinstance(t.env, build.EnvironmentVariables):
-            to['env'] = t.env.get_env({})
+            env = t.env.get_env({})
         else:
-            to['env'] = t.env
-        to['name'] = t.name
-        to['workdir'] = t.workdir
-        to['timeout'] = t.timeout
-        to['suite'] = t.suite
-        to['is_parallel'] = t.is_parallel
-        to['priority'] = t.priority
-        result.append(to)
+            env = t.env
+        result.append({
+            'cmd': fname + t.cmd_args,
+            'env': env,
+            'name': t.name,
+            'workdir': t.workdir,
+            'timeout': t.timeout,
+            'suite': t.suite,
+            'is_parallel': t.is_parallel,
+            'priority': t.priority,
+        })
     return result
 
 def list_tests(testdata) -> List[Dict[str, Union[str, int, List[str], Dict[str, str]]]]:
@@ -329,12 +378,23 @@ def list_projinfo_from_source(intr: IntrospectionInterpreter) -> Dict[str, Union
     files = find_buildsystem_files_list(sourcedir)
     files = [os.path.normpath(x) for x in files]
 
+    # Sort the files into their subprojects in a single pass, by looking
+    # up the directory below the subproject dir by name.
+    subprojects = {}  # type: Dict[str, List[str]]
     for i in intr.project_data['subprojects']:
-        basedir = os.path.join(intr.subproject_dir, i['name'])
-        i['buildsystem_files'] = [x for x in files if x.startswith(basedir)]
-        files = [x for x in files if not x.startswith(basedir)]
+        i['buildsystem_files'] = subprojects[i['name']] = []
+    subproject_prefix = os.path.join(os.path.normpath(intr.subproject_dir), '')
+    prefix_len = len(subproject_prefix)
+    main_files = []  # type: List[str]
+    for x in files:
+        if x.startswith(subproject_prefix):
+            sub_files = subprojects.get(x[prefix_len:].split(os.sep, 1)[0])
+            if sub_files is not None:
+                sub_files.append(x)
+                continue
+        main_files.append(x)
 
-    intr.project_data['buildsystem_files'] = files
+    intr.project_data['buildsystem_files'] = main_files
     intr.project_data['subproject_dir'] = intr.subproject_dir
     return intr.project_data
 
@@ -361,9 +421,9 @@ def run(options) -> int:
     indent = 4 if options.indent else None
     results = []  # type: List[Tuple[str, Union[dict, List[Any]]]]
     sourcedir = '.' if options.builddir == 'meson.build' else options.builddir[:-11]
-    intro_types = get_meson_introspection_types(sourcedir=sourcedir)
 
     if 'meson.build' in [os.path.basename(options.builddir), options.builddir]:
+        intro_types = get_meson_introspection_types(sourcedir=sourcedir)
         # Make sure that log entries in other parts of meson don't interfere with the JSON output
         mlog.disable()
         backend = backends.get_backend_from_name(options.backend, None)
@@ -398,9 +458,7 @@ def run(options) -> int:
             return 1
 
     # Extract introspection information from JSON
-    for i in intro_types.keys():
-        if not intro_types[i].func:
-            continue
+    for i in get_meson_introspection_files():
         if not options.all and not getattr(options, i, False):
             continue
         curr = os.path.join(infodir, 'intro-{}.json'.format(i))
@@ -414,13 +472,31 @@ def run(options) -> int:
 
 updated_introspection_files = []  # type: List[str]
 
+# The introspection files can be several megabytes and are written in many
+# small pieces, so use a bigger buffer than the default to cut down on
+# write calls.
+INTRO_FILE_BUFFER_SIZE = 1024 * 1024
+
 def write_intro_info(intro_info: Sequence[Tuple[str, Union[dict, List[Any]]]], info_dir: str) -> None:
     global updated_introspection_files
     for i in intro_info:
         out_file = os.path.join(info_dir, 'intro-{}.json'.format(i[0]))
         tmp_file = os.path.join(info_dir, 'tmp_dump.json')
-        with open(tmp_file, 'w') as fp:
-            json.dump(i[1], fp)
+        # json.dumps uses the C encoder while json.dump goes through the
+        # pure Python one, which is much slower on large target lists.
+        # Lists are written one element at a time so that the encoded
+        # form of a whole section never has to be held in memory. The
+        # output is identical to that of json.dumps on the whole list.
+        with open(tmp_file, 'w', buffering=INTRO_FILE_BUFFER_SIZE) as fp:
+            if isinstance(i[1], list):
+                fp.write('[')
+                for idx, elem in enumerate(i[1]):
+                    if idx:
+                        fp.write(', ')
+                    fp.write(json.dumps(elem))
+                fp.write(']')
+            else:
+                fp.write(json.dumps(i[1]))
             fp.flush() # Not sure if this is needed
         os.replace(tmp_file, out_file)
         updated_introspection_files += [i[0]]
@@ -428,14 +504,13 @@ def write_intro_info(intro_info: Sequence[Tuple[str, Union[dict, List[Any]]]], i
 def generate_introspection_file(builddata: build.Build, backend: backends.Backend) -> None:
     coredata = builddata.environment.get_coredata()
     intro_types = get_meson_introspection_types(coredata=coredata, builddata=builddata, backend=backend)
-    intro_info = []  # type: List[Tuple[str, Union[dict, List[Any]]]]
 
+    # Write out each section as soon as it has been generated, so that
+    # only one of them has to be kept in memory at a time.
     for key, val in intro_types.items():
         if not val.func:
             continue
-        intro_info += [(key, val.func())]
-
-    write_intro_info(intro_info, builddata.environment.info_dir)
+        write_intro_info([(key, val.func())], builddata.environment.info_dir)
 
 def update_build_options(coredata: cdata.CoreData, info_dir) -> None:
     intro_info = [
@@ -457,12 +532,9 @@ def write_meson_info_file(builddata: build.Build, errors: list, build_files_upda
     global updated_introspection_files
     info_dir = builddata.environment.info_dir
     info_file = get_meson_info_file(info_dir)
-    intro_types = get_meson_introspection_types()
     intro_info = {}
 
-    for i in intro_types.keys():
-        if not intro_types[i].func:
-            continue
+    for i in get_meson_introspection_files():
         intro_info[i] = {
             'file': 'intro-{}.json'.format(i),
             'updated': i in updated_introspection_files
@@ -490,7 +562,7 @@ def write_meson_info_file(builddata: build.Build, errors: list, build_files_upda
 
     # Write the data to disc
     tmp_file = os.path.join(info_dir, 'tmp_dump.json')
-    with open(tmp_file, 'w') as fp:
+    with open(tmp_file, 'w', buffering=INTRO_FILE_BUFFER_SIZE) as fp:
         json.dump(info_data, fp)
         fp.flush()
     os.replace(tmp_file, info_file)
@@ -46,6 +46,7 @@ import mesonbuild.compilers
 import mesonbuild.environment
 import mesonbuild.mesonlib
 import mesonbuild.coredata
+import mesonbuild.mintro
 import mesonbuild.modules.gnome
 from mesonbuild.interpreter import Interpreter, ObjectHolder
 from mesonbuild.ast import AstInterpreter
@@ -1161,6 +1162,21 @@ class InternalTests(unittest.TestCase):
             deps = d.get_all_dependencies(target)
             self.assertEqual(deps, expdeps)
 
+    @unittest.skipIf(is_windows(), 'Creating symlinks requires privileges on Windows')
+    def test_find_buildsystem_files_list_symlinks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.mkdir(os.path.join(tmpdir, 'sub'))
+            for f in ('meson.build', 'meson_options.txt', os.path.join('sub', 'meson.build')):
+                open(os.path.join(tmpdir, f), 'w').close()
+            # Symlinked directories are not descended into
+            os.symlink('sub', os.path.join(tmpdir, 'linked'))
+            # Neither looping nor dangling symlinks are an error
+            os.symlink('selfloop', os.path.join(tmpdir, 'selfloop'))
+            os.symlink('nonexistent', os.path.join(tmpdir, 'dangling'))
+            files = mesonbuild.mintro.find_buildsystem_files_list(tmpdir)
+        self.assertEqual(sorted(files[:2]), ['meson.build', 'meson_options.txt'])
+        self.assertEqual(files[2:], [os.path.join('sub', 'meson.build')])
+
 
 @unittest.skipIf(is_tarball(), 'Skipping because this is a tarball release')
 class DataTests(unittest.TestCase):
@@ -1924,6 +1940,22 @@ class AllPlatformTests(BasePlatformTests):
         self.assertPathListEqual(intro[0]['install_filename'], ['/usr/lib/libstat.a'])
         self.assertPathListEqual(intro[1]['install_filename'], ['/usr/bin/prog' + exe_suffix])
 
+    def test_install_introspection_dotdot_install_dir(self):
+        '''
+        Tests that '..' components in install_dir are kept as-is in
+        install_filename, so that it matches the intro-installed.json entry
+        '''
+        if self.backend is not Backend.ninja:
+            raise unittest.SkipTest('{!r} backend can\'t install files'.format(self.backend.name))
+        testdir = os.path.join(self.unit_test_dir, '73 install dir dotdot')
+        self.init(testdir)
+        targets = self.introspect('--targets')
+        installed = self.introspect('--installed')
+        self.assertEqual(len(targets), 1)
+        install_filename = targets[0]['install_filename'][0]
+        self.assertPathEqual(install_filename, '/usr/lib/../lib64/prog' + exe_suffix)
+        self.assertIn(install_filename, installed.values())
+
     def test_install_subdir_introspection(self):
         '''
         Test that the Meson introspection API also contains subdir install information
@@ -3694,6 +3726,19 @@ recommended as it is not supported on some platforms''')
         self.assertEqual(res['subprojects'][0]['version'], 'undefined')
         self.assertEqual(res['subprojects'][0]['descriptive_name'], 'subproject')
 
+    def test_introspect_projectinfo_subproject_name_prefix_without_configured_build(self):
+        # A subproject must not claim the files of another subproject whose
+        # name it is a prefix of
+        testfile = os.path.join(self.unit_test_dir, '72 subproject name prefix', 'meson.build')
+        res = self.introspect_directory(testfile, '--projectinfo')
+        self.assertEqual(set(res['buildsystem_files']), set(['meson.build']))
+        subprojects = {s['name']: set(f.replace('\\', '/') for f in s['buildsystem_files'])
+                       for s in res['subprojects']}
+        self.assertEqual(subprojects, {
+            'foo': set(['subprojects/foo/meson.build', 'subprojects/foo/meson_options.txt']),
+            'foobar': set(['subprojects/foobar/meson.build']),
+        })
+
     def test_introspect_projectinfo_subprojects(self):
         testdir = os.path.join(self.common_test_dir, '102 subproject subdir')
         self.init(testdir)